@@ -1,8 +1,12 @@
-import json
-import html
-from datetime import datetime
-
-import pandas as pd
+import asyncio
+import atexit
+import functools
+import re
+import time
+from datetime import datetime, timezone
+
+import httpx
+import orjson
 import requests
 import gradio as gr
 
@@ -10,45 +14,131 @@ import gradio as gr
 # =========================
 # Backend helpers
 # =========================
+# Session partagée : réutilise les connexions TCP/TLS (Keep-Alive) au lieu de
+# refaire un handshake complet à chaque appel /health ou /predict.
+_SESSION = requests.Session()
+_ADAPTER = requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=20)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.headers["Accept-Encoding"] = "gzip"
+
+
+# Contrat affiché dans l'accordéon : constant, sérialisé une seule fois
+# (orjson, déjà utilisé pour le parse des réponses /predict).
+_API_CONTRACT_JSON = orjson.dumps(
+    {
+        "GET /health": "HTTP 200",
+        "POST /predict body": {"text": "fièvre, toux, fatigue", "top_k": 3},
+    },
+    option=orjson.OPT_INDENT_2,
+).decode()
+
+
+# L'URL saisie change rarement : mémoriser la normalisation évite les
+# strip/rstrip répétés à chaque callback et stabilise la clé du cache de ping.
+@functools.lru_cache(maxsize=16)
 def _norm_base(url: str) -> str:
     return (url or "").strip().rstrip("/")
 
 
-def ping(api_base: str) -> tuple[bool, str]:
+# Cache TTL du statut backend : évite de repayer un aller-retour /health
+# quand le même URL vient d'être testé (ex: on_clear juste après on_test).
+_PING_TTL = 5.0
+_PING_CACHE: dict[str, tuple[float, bool, str]] = {}
+
+
+def ping(api_base: str, force: bool = False) -> tuple[bool, str]:
     api_base = _norm_base(api_base)
     if not api_base:
         return False, "URL vide"
+    if not force:
+        cached = _PING_CACHE.get(api_base)
+        if cached is not None and time.monotonic() - cached[0] < _PING_TTL:
+            return cached[1], cached[2]
     try:
-        r = requests.get(f"{api_base}/health", timeout=2)
+        r = _SESSION.get(f"{api_base}/health", timeout=2)
         if r.status_code == 200:
-            return True, "Connecté"
-        return False, f"Réponse backend: {r.status_code}"
+            ok, msg = True, "Connecté"
+        else:
+            ok, msg = False, f"Réponse backend: {r.status_code}"
     except Exception as e:
-        return False, f"Indisponible ({type(e).__name__})"
+        ok, msg = False, f"Indisponible ({type(e).__name__})"
+    _PING_CACHE[api_base] = (time.monotonic(), ok, msg)
+    return ok, msg
+
+
+# Client async partagé pour /predict : l'I/O réseau est multiplexée sur la
+# boucle d'événements de Gradio au lieu de bloquer un thread worker jusqu'à 20 s.
+_ACLIENT = httpx.AsyncClient(
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    headers={"Accept-Encoding": "gzip"},
+    timeout=20.0,
+)
+def _close_aclient() -> None:
+    # À ce stade la boucle uvicorn qui portait les connexions est déjà fermée ;
+    # la fermeture peut échouer (RuntimeError: Event loop is closed) sans que
+    # ça n'ait d'importance — le process se termine, on reste silencieux.
+    try:
+        asyncio.run(_ACLIENT.aclose())
+    except Exception:
+        pass
+
 
+atexit.register(_close_aclient)
 
-def post_predict(api_base: str, text: str, top_k: int) -> dict:
+
+async def post_predict(api_base: str, text: str, top_k: int) -> dict:
     api_base = _norm_base(api_base)
     payload = {"text": text, "top_k": int(top_k)}
-    r = requests.post(f"{api_base}/predict", json=payload, timeout=20)
-    r.raise_for_status()
-    return r.json()
+    r = await _ACLIENT.post(f"{api_base}/predict", json=payload)
+    # Comparaison directe du code : le chemin nominal évite la mécanique
+    # de raise_for_status (messages par plage de statuts, etc.).
+    if r.status_code != 200:
+        raise httpx.HTTPStatusError(f"HTTP {r.status_code}", request=r.request, response=r)
+    # orjson parse les bytes directement : pas de détour par r.text (décodage
+    # UTF-8 + copie) ni par le parseur json pur-Python.
+    return orjson.loads(r.content)
 
 
 # =========================
 # UI helpers (HTML)
 # =========================
+# Échappement HTML en une seule passe str.translate, au lieu des replace
+# successifs de html.escape (une allocation intermédiaire par caractère spécial).
+_HTML_ESCAPE_MAP = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;"}
+)
+_NEEDS_ESCAPE = re.compile(r"[&<>\"']").search
+
+
+def _esc(s) -> str:
+    # La plupart des tokens ("high_fever", "cough"...) n'ont rien à échapper :
+    # un scan regex en C suffit alors, sans copie de la chaîne.
+    s = str(s)
+    return s.translate(_HTML_ESCAPE_MAP) if _NEEDS_ESCAPE(s) else s
+
+
+_OPEN_TAG = "<span class='tag'>"
+_OPEN_TAG2 = "<span class='tag tag2'>"
+_CLOSE_TAG = "</span>"
+
+
 def tags_html(items: list[str], variant: str = "tag") -> str:
     if not items:
         return "<span class='muted'>—</span>"
-    cls = "tag" if variant == "tag" else "tag tag2"
-    safe = [html.escape(str(x)) for x in items]
-    return "<div class='tags'>" + "".join([f"<span class='{cls}'>{x}</span>" for x in safe]) + "</div>"
+    # Un seul join sur les éléments échappés : pas de f-string par item.
+    open_tag = _OPEN_TAG if variant == "tag" else _OPEN_TAG2
+    sep = _CLOSE_TAG + open_tag
+    body = sep.join(_esc(x) for x in items)
+    return "<div class='tags'>" + open_tag + body + _CLOSE_TAG + "</div>"
 
 
+# Peu d'états (ok, msg, top_k) distincts par session : les blocs HTML sont
+# purs, on mémorise donc le rendu plutôt que de reformater à chaque callback.
+@functools.lru_cache(maxsize=32)
 def status_badge(ok: bool, msg: str) -> str:
     dot = "dot-ok" if ok else "dot-bad"
-    safe_msg = html.escape(msg)
+    safe_msg = _esc(msg)
     return f"""
     <div class="badge">
       <span class="dot {dot}"></span>
@@ -57,6 +147,7 @@ def status_badge(ok: bool, msg: str) -> str:
     """
 
 
+@functools.lru_cache(maxsize=32)
 def hero_block(ok: bool, msg: str, top_k: int) -> str:
     return f"""
     <div class="hero">
@@ -73,18 +164,20 @@ def hero_block(ok: bool, msg: str, top_k: int) -> str:
     """
 
 
-def build_details_html(data: dict) -> str:
-    primary = html.escape(str(data.get("primary_disease", "—")))
-    specialist = html.escape(str(data.get("specialist", "—")))
+def build_details_html(data: dict, ts: str) -> str:
+    primary = _esc(data.get("primary_disease", "—"))
+    specialist = _esc(data.get("specialist", "—"))
 
     found = data.get("found_symptoms", []) or []
     precautions = data.get("precautions", []) or []
     typical = data.get("typical_symptoms", []) or []
 
     if precautions:
-        precautions_html = "<ul>" + "".join(
-            [f"<li>{html.escape(str(p))}</li>" for p in precautions]
-        ) + "</ul>"
+        # Même schéma que tags_html : un join unique avec le séparateur
+        # </li><li>, pas de f-string ni de liste intermédiaire par item.
+        precautions_html = (
+            "<ul><li>" + "</li><li>".join(_esc(p) for p in precautions) + "</li></ul>"
+        )
     else:
         precautions_html = "<span class='muted'>—</span>"
 
@@ -116,28 +209,40 @@ def build_details_html(data: dict) -> str:
         {tags_html(typical, "tag2")}
       </div>
 
-      <div class="foot muted">Horodatage: {html.escape(datetime.utcnow().isoformat() + "Z")}</div>
+      <div class="foot muted">Horodatage: {ts}</div>
     </div>
     """
 
 
-def predictions_to_df(data: dict) -> pd.DataFrame:
+# pandas n'est utile qu'à l'onglet Détails & Debug : l'import (~0,3 s) est
+# différé au premier résultat pour accélérer le démarrage du process.
+@functools.lru_cache(maxsize=1)
+def _empty_preds_df() -> "pd.DataFrame":
+    import pandas as pd
+
+    # Frame vide partagée : Gradio la sérialise sans la modifier, inutile de
+    # reconstruire un DataFrame (init du block manager) à chaque reset/erreur.
+    return pd.DataFrame(
+        {"disease": pd.Series([], dtype="object"), "probability": pd.Series([], dtype="float64")}
+    )
+
+
+def predictions_to_df(data: dict) -> "pd.DataFrame":
+    import pandas as pd
+
     preds = data.get("predictions", []) or []
     if not preds:
-        return pd.DataFrame(columns=["disease", "probability"])
-    df = pd.DataFrame(preds)
-    if "disease" not in df.columns:
-        df["disease"] = ""
-    if "probability" not in df.columns:
-        df["probability"] = None
-    return df[["disease", "probability"]]
+        return _empty_preds_df()
+    # from_records avec columns projette directement les deux clés attendues
+    # (clé absente -> NaN) : pas de frame intermédiaire ni de copie df[[...]].
+    return pd.DataFrame.from_records(preds, columns=("disease", "probability"))
 
 
 # =========================
 # Callbacks
 # =========================
 def on_test(api_url: str, top_k: int):
-    ok, msg = ping(api_url)
+    ok, msg = ping(api_url, force=True)  # test explicite : on invalide le cache
     return hero_block(ok, msg, top_k), status_badge(ok, msg)
 
 
@@ -148,24 +253,24 @@ def on_clear(api_url: str, top_k: int):
         [],                                   # history_state
         None,                                 # last_raw json
         "",                                   # details html
-        pd.DataFrame(columns=["disease", "probability"]),  # table
+        _empty_preds_df(),                    # table
         hero_block(ok, msg, top_k),
         status_badge(ok, msg),
     )
 
 
-def on_send(user_text: str, api_url: str, top_k: int, history: list):
+async def on_send(user_text: str, api_url: str, top_k: int, history: list):
     user_text = (user_text or "").strip()
     history = history or []
 
     if not user_text:
-        return "", history, history, None, "", pd.DataFrame(columns=["disease", "probability"])
+        return "", history, history, None, "", _empty_preds_df()
 
     # Optimistic UI
     history = history + [(user_text, "…")]
 
     try:
-        data = post_predict(api_url, user_text, top_k)
+        data = await post_predict(api_url, user_text, top_k)
 
         primary = data.get("primary_disease", "—")
         found = data.get("found_symptoms", []) or []
@@ -174,12 +279,18 @@ def on_send(user_text: str, api_url: str, top_k: int, history: list):
         bot_msg = f"**Résultat :** {primary}\n\n**Symptômes détectés :** {found_str}"
         history[-1] = (user_text, bot_msg)
 
-        details = build_details_html(data)
+        # Horodatage figé au moment de la prédiction ; format ISO8601 fixe,
+        # aucun caractère HTML spécial donc pas d'échappement nécessaire.
+        ts = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        details = build_details_html(data, ts)
         df = predictions_to_df(data)
 
         return "", history, history, data, details, df
 
-    except requests.exceptions.RequestException as e:
+    # httpx.InvalidURL n'hérite pas de HTTPError : une URL malformée dans le
+    # champ texte doit aussi aboutir à la carte d'erreur, pas à un crash.
+    # Idem pour orjson.JSONDecodeError si le backend renvoie un corps non-JSON.
+    except (httpx.HTTPError, httpx.InvalidURL, orjson.JSONDecodeError) as e:
         err = (
             "Je n’arrive pas à contacter le service de prédiction.\n\n"
             f"- URL: `{api_url}`\n"
@@ -187,7 +298,7 @@ def on_send(user_text: str, api_url: str, top_k: int, history: list):
             "Vérifie que le backend tourne et que `/health` répond."
         )
         history[-1] = (user_text, err)
-        return "", history, history, None, "", pd.DataFrame(columns=["disease", "probability"])
+        return "", history, history, None, "", _empty_preds_df()
 
 
 # =========================
@@ -270,18 +381,7 @@ with gr.Blocks(title="Chatbot Santé") as demo:
             status_box = gr.HTML(status_badge(False, "Non testé"))
 
             with gr.Accordion("Contrat API attendu", open=False):
-                gr.Code(
-                    json.dumps(
-                        {
-                            "GET /health": "HTTP 200",
-                            "POST /predict body": {"text": "fièvre, toux, fatigue", "top_k": 3},
-                        },
-                        ensure_ascii=False,
-                        indent=2,
-                    ),
-                    language="json",
-                    label="",
-                )
+                gr.Code(_API_CONTRACT_JSON, language="json", label="")
 
         with gr.Column(scale=2, min_width=520):
             gr.Markdown("### Chat")
@@ -293,7 +393,8 @@ with gr.Blocks(title="Chatbot Santé") as demo:
             with gr.Accordion("Détails & Debug", open=False):
                 details = gr.HTML("")
                 preds_table = gr.Dataframe(
-                    value=pd.DataFrame(columns=["disease", "probability"]),
+                    value=None,
+                    headers=["disease", "probability"],
                     label="Top maladies (probabilités)",
                     interactive=False,
                     wrap=True,
@@ -313,12 +414,14 @@ with gr.Blocks(title="Chatbot Santé") as demo:
         on_send,
         inputs=[user_text, api_url, top_k, history_state],
         outputs=[user_text, chatbot, history_state, last_raw, details, preds_table],
+        concurrency_limit=32,
     )
 
     user_text.submit(
         on_send,
         inputs=[user_text, api_url, top_k, history_state],
         outputs=[user_text, chatbot, history_state, last_raw, details, preds_table],
+        concurrency_limit=32,
     )
 
 # Gradio 6: css + theme à passer dans launch()